@@ -1,10 +1,58 @@
 import asyncio
+import json
+import os
+import random
+import struct
+import zlib
+from collections import deque
+from contextlib import suppress
 import aiohttp
-from datetime import datetime
-from astrbot.api.event import filter, AstrMessageEvent
+import time
+from astrbot.api.event import filter, AstrMessageEvent, MessageChain
 from astrbot.api.star import Context, Star, register
 from astrbot.api import logger
 
+BATCH_URL = "https://api.live.bilibili.com/room/v1/Room/get_status_info_by_uids"
+BATCH_SIZE = 100
+WORKER_COUNT = 16  # 逐个检查直播间时的并发数
+SHARE_TTL = 2  # 相同请求的结果在这段时间内直接复用
+ANCHOR_CACHE_TTL = 600  # 主播信息缓存时间
+NOTIFY_FLUSH_INTERVAL = 30  # 没有新通知时也定期尝试发送积压的通知
+# 记录各群的会话标识，重启后仍能主动推送
+ORIGINS_FILE = os.path.join("data", "plugin_data", "astrbot_plugin_bilibili_livereminder", "group_origins.json")
+
+MAX_BACKOFF = 600  # 接口连续失败时的最长等待秒数
+
+WS_URL = "wss://broadcastlv.chat.bilibili.com:443/sub"
+WS_HEADER = struct.Struct(">IHHII")  # 包长, 头长, 协议版本, 操作码, 序列号
+WS_OP_HEARTBEAT = 2
+WS_OP_MESSAGE = 5
+WS_OP_AUTH = 7
+WS_OP_AUTH_REPLY = 8
+WS_HEARTBEAT_INTERVAL = 30
+WS_RECONNECT_DELAY = 10
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+class RoomState:
+    """单个直播间的状态记录"""
+    __slots__ = ('last_status', 'live_start_monotonic', 'live_start_wall', 'anchor_name')
+
+    def __init__(self, last_status, anchor_name):
+        self.last_status = last_status
+        self.live_start_monotonic = None  # 开播时刻，事件循环的单调时钟
+        self.live_start_wall = None  # 开播时间戳，仅用于展示
+        self.anchor_name = anchor_name
+
 @register(
     "astrbot_plugin_bilibili_livereminder", 
     "Dayanshifu", 
@@ -16,215 +64,598 @@ class BilibiliLiveMonitor(Star):
     def __init__(self, context: Context):
         super().__init__(context)
         # 从插件配置获取监控列表
-        self.monitor_list = self.get_config("monitor_list", [])
+        self.monitor_list = []
+        # 统一直播间ID和uid为int，避免配置里写成字符串时匹配不上；格式错误的条目跳过
+        for room_config in self.get_config("monitor_list", []):
+            try:
+                rid = int(room_config['room_id'])
+                uid = int(room_config['uid']) if room_config.get('uid') else None
+            except (KeyError, TypeError, ValueError, AttributeError):
+                logger.error(f"直播间配置格式错误，已跳过: {room_config}")
+                continue
+            room_config['room_id'] = rid
+            if uid:
+                room_config['uid'] = uid
+            # 预先生成直播间链接和默认主播名，拼接消息时直接使用
+            room_config['_link'] = f"https://live.bilibili.com/{rid}"
+            room_config['_default_name'] = f"主播{rid}"
+            self.monitor_list.append(room_config)
+        self.monitor_map = {r['room_id']: r for r in self.monitor_list}
         self.white_list_groups = self.get_config("white_list_groups", ["1044727986"])
+        self._white_set = frozenset(str(gid) for gid in self.white_list_groups)
         self.check_interval = self.get_config("check_interval", 60)
+        # 开启长连接后，已连上的直播间只做低频兜底轮询
+        self.enable_websocket = self.get_config("enable_websocket", True)
+        self.reconcile_interval = self.get_config("reconcile_interval", 600)
+        # uid -> room_id，用于批量接口返回结果回填到直播间
+        self.uid_map = {r['uid']: r['room_id'] for r in self.monitor_list if r.get('uid')}
         
         # 存储每个直播间状态
         self.room_status = {}
         self.session = None
+        self.ws_session = None
+        self._session_ready = asyncio.Event()
+        self.ws_tasks = []
+        # 长连接当前在线的直播间，其余直播间仍按check_interval轮询
+        self._ws_connected = set()
+        
+        # 逐个检查直播间的工作队列和结果队列，由固定数量的worker消费
+        self._work_q = asyncio.Queue()
+        self._out_q = asyncio.Queue()
+        self.worker_tasks = []
+        
+        # 进行中的请求和最近的结果（按URL），让同时发起的相同请求只访问一次接口
+        self._inflight = {}
+        self._recent = {}
+        # room_id -> (获取时间, 主播信息)
+        self._anchor_cache = {}
+        
+        # 接口失败退避：连续失败的轮次，以及服务端要求的等待时间
+        self._consecutive_failures = 0
+        self._cycle_failed = False
+        self._cycle_succeeded = False
+        self._retry_after = 0
         
         # 存储待发送的通知（按群号分组）
         self.pending_notifications = {}
+        # 群号 -> 会话标识，收到过该群消息后即可主动推送通知
+        self._group_origins = self._load_group_origins()
+        # 配置了平台ID时，可直接向尚未发言的白名单群推送
+        platform_id = self.get_config("platform_id", "")
+        if platform_id:
+            for group_id in self._white_set:
+                self._group_origins.setdefault(group_id, f"{platform_id}:GroupMessage:{group_id}")
+        self._notify_event = asyncio.Event()
         
-        asyncio.create_task(self.init_session())
-        asyncio.create_task(self.monitor_task())
+        self.monitor = asyncio.create_task(self.monitor_task())
+        self.flush_task = asyncio.create_task(self._flush_task())
+
+    @staticmethod
+    def _load_group_origins():
+        """读取保存的群会话标识"""
+        try:
+            with open(ORIGINS_FILE, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"读取群会话记录失败: {str(e)}")
+        return {}
+
+    def _save_group_origins(self):
+        """保存群会话标识"""
+        try:
+            os.makedirs(os.path.dirname(ORIGINS_FILE), exist_ok=True)
+            with open(ORIGINS_FILE, "w", encoding="utf-8") as f:
+                json.dump(self._group_origins, f, ensure_ascii=False)
+        except Exception as e:
+            logger.error(f"保存群会话记录失败: {str(e)}")
 
     async def init_session(self):
         """初始化aiohttp会话"""
-        self.session = aiohttp.ClientSession(headers={
-            "User-Agent": "Mozilla/5.0",
-            "Referer": "https://live.bilibili.com"
-        })
+        # 所有请求都发往同一组B站域名，复用连接并缓存DNS
+        connector = aiohttp.TCPConnector(
+            limit=32,
+            limit_per_host=16,
+            ttl_dns_cache=300,
+            keepalive_timeout=75,
+            enable_cleanup_closed=True
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=10, connect=3, sock_read=8),
+            headers={
+                "User-Agent": "Mozilla/5.0",
+                "Referer": "https://live.bilibili.com"
+            }
+        )
+        # 长连接会一直占用连接，单独建会话，不受上面的连接数限制
+        self.ws_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=0, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(connect=10),
+            headers={
+                "User-Agent": "Mozilla/5.0",
+                "Referer": "https://live.bilibili.com"
+            }
+        )
+
+    @staticmethod
+    def _read_retry_after(resp):
+        """读取服务端给出的Retry-After秒数"""
+        retry_after = resp.headers.get("Retry-After", "")
+        return int(retry_after) if retry_after.isdigit() else 0
+
+    def _note_failure(self, retry_after=0):
+        """记录一次请求失败（HTTP错误、限流或网络异常）"""
+        self._cycle_failed = True
+        self._retry_after = max(self._retry_after, retry_after)
+
+    def _next_delay(self, interval):
+        """计算下一轮检查前的等待时间，连续失败时指数退避并加入抖动"""
+        # 本轮只要有直播间检查成功，就不算失败
+        if self._cycle_failed and not self._cycle_succeeded:
+            self._consecutive_failures += 1
+        else:
+            self._consecutive_failures = 0
+        self._cycle_failed = False
+        self._cycle_succeeded = False
+        
+        retry_after, self._retry_after = self._retry_after, 0
+        if not self._consecutive_failures:
+            return interval
+        delay = min(interval * 2 ** self._consecutive_failures, max(MAX_BACKOFF, interval))
+        delay = max(delay, retry_after) + random.uniform(0, 5)
+        logger.warning(f"接口已连续失败 {self._consecutive_failures} 轮，{delay:.0f} 秒后重试")
+        return delay
+
+    async def _shared_request(self, url, fetch):
+        """合并对同一URL的并发请求，并在短时间内复用结果"""
+        loop = asyncio.get_running_loop()
+        recent = self._recent.get(url)
+        if recent and loop.time() - recent[0] < SHARE_TTL:
+            return recent[1]
+        
+        task = self._inflight.get(url)
+        if task is None:
+            # 请求在独立任务中执行，某个调用方被取消不会影响其他等待者
+            task = asyncio.create_task(fetch())
+            self._inflight[url] = task
+            
+            def on_done(t):
+                self._inflight.pop(url, None)
+                if t.cancelled() or t.exception() is not None:
+                    return
+                result = t.result()
+                # 请求失败（None或data为None）的结果不复用
+                if result is not None and result.get('data', result) is not None:
+                    self._recent[url] = (loop.time(), result)
+            
+            task.add_done_callback(on_done)
+        return await asyncio.shield(task)
 
     async def check_live_status(self, room_id):
-        """检查单个直播间状态"""
+        """检查单个直播间状态（批量接口的后备方案）
+        
+        接口返回错误码时返回None；HTTP错误或网络异常时返回data为None的结果，
+        供监控轮询计入退避
+        """
+        url = f"https://api.live.bilibili.com/room/v1/Room/get_info?room_id={room_id}"
+        return await self._shared_request(url, lambda: self._fetch_live_status(room_id, url))
+
+    async def _fetch_live_status(self, room_id, url):
+        """请求单个直播间状态"""
         try:
-            url = f"https://api.live.bilibili.com/room/v1/Room/get_info?room_id={room_id}"
-            async with self.session.get(url, timeout=10) as resp:
-                data = await resp.json()
+            async with self.session.get(url) as resp:
+                if resp.status != 200:
+                    logger.error(f"检查直播间 {room_id} 状态失败: HTTP {resp.status}")
+                    return {'room_id': room_id, 'data': None, 'retry_after': self._read_retry_after(resp)}
+                data = json_loads(await resp.read())
                 if data.get('code') == 0:
                     return {
                         'room_id': room_id,
                         'data': data['data'],
-                        'check_time': datetime.now()
+                        'check_time': time.time()
                     }
+                logger.error(f"检查直播间 {room_id} 状态失败: {data.get('message')}")
+                return None
         except Exception as e:
             logger.error(f"检查直播间 {room_id} 状态失败: {str(e)}")
-        return None
+        return {'room_id': room_id, 'data': None, 'retry_after': 0}
+
+    async def check_live_status_batch(self, uids):
+        """通过uid批量检查直播间状态"""
+        results = []
+        for i in range(0, len(uids), BATCH_SIZE):
+            chunk = uids[i:i + BATCH_SIZE]
+            try:
+                async with self.session.post(BATCH_URL, json={"uids": chunk}) as resp:
+                    if resp.status != 200:
+                        self._note_failure(self._read_retry_after(resp))
+                        logger.error(f"批量检查直播间状态失败: HTTP {resp.status}")
+                        continue
+                    data = json_loads(await resp.read())
+                    if data.get('code') != 0:
+                        logger.error(f"批量检查直播间状态失败: {data.get('message')}")
+                        continue
+                    check_time = time.time()
+                    for uid, info in (data.get('data') or {}).items():
+                        room_id = self.uid_map.get(int(uid))
+                        if room_id is None:
+                            continue
+                        results.append({
+                            'room_id': room_id,
+                            'data': info,
+                            'check_time': check_time
+                        })
+            except Exception as e:
+                self._note_failure()
+                logger.error(f"批量检查直播间状态失败: {str(e)}")
+        return results
 
     async def get_anchor_info(self, room_id):
         """获取主播信息"""
+        cached = self._anchor_cache.get(room_id)
+        if cached and asyncio.get_running_loop().time() - cached[0] < ANCHOR_CACHE_TTL:
+            return cached[1]
+        room_url = f"https://api.live.bilibili.com/xlive/web-room/v1/index/getInfoByRoom?room_id={room_id}"
+        return await self._shared_request(room_url, lambda: self._fetch_anchor_info(room_id, room_url))
+
+    async def _fetch_anchor_info(self, room_id, room_url):
+        """请求主播信息"""
         try:
-            room_url = f"https://api.live.bilibili.com/xlive/web-room/v1/index/getInfoByRoom?room_id={room_id}"
-            async with self.session.get(room_url, timeout=5) as resp:
-                room_data = await resp.json()
+            async with self.session.get(room_url) as resp:
+                room_data = json_loads(await resp.read())
                 if room_data['code'] == 0:
-                    return {
+                    anchor_info = {
                         'name': room_data['data']['anchor']['base_info']['uname'],
                         'title': room_data['data']['room_info']['title']
                     }
+                    # 只缓存成功的结果，失败时下次仍会重新请求
+                    self._anchor_cache[room_id] = (asyncio.get_running_loop().time(), anchor_info)
+                    return anchor_info
         except Exception as e:
             logger.error(f"获取直播间 {room_id} 信息失败: {str(e)}")
-        return {'name': f"主播{room_id}", 'title': '未知标题'}
+        room_config = self.monitor_map.get(room_id)
+        default_name = room_config['_default_name'] if room_config else f"主播{room_id}"
+        return {'name': default_name, 'title': '未知标题'}
 
     def is_group_in_white_list(self, group_id):
         """检查群号是否在白名单中"""
-        if not group_id:
-            return False
-        return str(group_id) in [str(gid) for gid in self.white_list_groups]
+        return bool(group_id) and str(group_id) in self._white_set
+
+    async def update_room_status(self, room_id, data):
+        """根据最新数据更新直播间状态，状态变化时生成通知"""
+        # 轮播(2)和未开播(0)都视为下播，避免推送的0和轮询的2被当成两次变化
+        current_status = 1 if data['live_status'] == 1 else 0
+        
+        # 获取房间配置信息
+        room_config = self.monitor_map.get(room_id)
+        if not room_config:
+            return
+        
+        # 配置里可能是短号，长连接认证需要接口返回的真实房间号
+        if data.get('room_id'):
+            room_config['_real_id'] = data['room_id']
+        
+        # 单个接口返回了uid，记录下来后续改走批量接口
+        if not room_config.get('uid') and data.get('uid'):
+            room_config['uid'] = data['uid']
+            self.uid_map[data['uid']] = room_id
+        
+        anchor_name = room_config.get('anchor_name', room_config['_default_name'])
+        
+        # 初始化状态记录
+        state = self.room_status.get(room_id)
+        if state is None:
+            self.room_status[room_id] = RoomState(current_status, anchor_name)
+            logger.info(f"初始化直播间 {room_id}({anchor_name}) 状态: {'开播' if current_status == 1 else '下播'}")
+            return
+        
+        # 状态变化处理
+        if current_status == state.last_status:
+            return
+        # 先记录新状态，避免长连接和轮询同时处理同一次变化
+        state.last_status = current_status
+        
+        message = ""
+        if current_status == 1:  # 开播
+            # 批量接口和推送消息给出的是时间戳，单个接口给出的是字符串
+            now_wall = time.time()
+            live_time = data.get('live_time')
+            if not isinstance(live_time, int) or live_time <= 0:
+                live_time = now_wall
+            # 时长用单调时钟计算，墙上时间只用于展示
+            state.live_start_wall = live_time
+            state.live_start_monotonic = (
+                asyncio.get_running_loop().time() - (now_wall - live_time))
+            
+            # 状态接口已带标题（批量接口还带主播名），缺少时才单独请求
+            actual_name = data.get('uname') or state.anchor_name
+            title = data.get('title')
+            if not title:
+                anchor_info = await self.get_anchor_info(room_id)
+                actual_name = anchor_info['name']
+                title = anchor_info['title']
+            room_config['anchor_name'] = actual_name  # 更新配置中的名字
+            state.anchor_name = actual_name
+            
+            message = f"{actual_name}开播了！\n传送门：{room_config['_link']}"
+            if title != '未知标题':
+                message += f"\n标题：{title}"
+                
+        else:  # 下播
+            actual_name = state.anchor_name
+            start_time = state.live_start_monotonic
+            
+            if start_time is not None:
+                duration = asyncio.get_running_loop().time() - start_time
+                hours, remainder = divmod(duration, 3600)
+                minutes, seconds = divmod(remainder, 60)
+                duration_text = f"{int(hours)}时{int(minutes)}分"
+                message = f"{actual_name}的直播已结束，一共直播了{duration_text}"
+            else:
+                message = f"{actual_name}的直播已结束"
+            state.live_start_monotonic = None
+            state.live_start_wall = None
+        
+        # 为所有白名单群组添加通知
+        for group_id in self._white_set:
+            self.pending_notifications.setdefault(group_id, deque()).append(message)
+        self._notify_event.set()
+        
+        logger.info(f"直播间 {room_id} 状态变化，已为 {len(self._white_set)} 个群组添加通知: {message}")
 
     async def monitor_task(self):
         """监控任务主循环"""
-        await asyncio.sleep(5)  # 等待session初始化
+        await self.init_session()
+        self._session_ready.set()
+        self.worker_tasks = [asyncio.create_task(self._status_worker()) 
+                            for _ in range(WORKER_COUNT)]
         
+        # 为每个直播间建立长连接，实时接收开播/下播事件
+        if self.enable_websocket:
+            for room_info in self.monitor_list:
+                self.ws_tasks.append(asyncio.create_task(self._ws_room(room_info['room_id'])))
+        
+        loop = asyncio.get_running_loop()
+        last_reconcile = None
         while True:
             try:
-                if not self.monitor_list:
-                    await asyncio.sleep(self.check_interval)
-                    continue
+                # 长连接在线的直播间只在兜底间隔到达时检查，其余每轮都检查
+                now = loop.time()
+                if (not self.enable_websocket or last_reconcile is None 
+                        or now - last_reconcile >= self.reconcile_interval):
+                    last_reconcile = now
+                    rooms = self.monitor_list
+                else:
+                    rooms = [room_info for room_info in self.monitor_list 
+                            if room_info['room_id'] not in self._ws_connected]
                 
-                # 并行检查所有直播间
-                tasks = [self.check_live_status(room_info['room_id']) 
-                        for room_info in self.monitor_list]
-                results = await asyncio.gather(*tasks)
+                # 已知uid的直播间走批量接口，其余逐个检查
+                results = await self.check_live_status_batch(
+                    [room_info['uid'] for room_info in rooms if room_info.get('uid')])
+                pending_rooms = [room_info['room_id'] for room_info in rooms 
+                                if not room_info.get('uid')]
+                for room_id in pending_rooms:
+                    self._work_q.put_nowait(room_id)
+                for _ in pending_rooms:
+                    results.append(await self._out_q.get())
                 
                 for result in results:
+                    # 接口错误码（如直播间不存在）已记录日志，不计入退避
                     if result is None:
                         continue
-                    
-                    room_id = result['room_id']
-                    data = result['data']
-                    current_status = data['live_status']
-                    
-                    # 获取房间配置信息
-                    room_config = next((r for r in self.monitor_list 
-                                      if r['room_id'] == room_id), None)
-                    if not room_config:
-                        continue
-                    
-                    anchor_name = room_config.get('anchor_name', f"主播{room_id}")
-                    
-                    # 初始化状态记录
-                    if room_id not in self.room_status:
-                        self.room_status[room_id] = {
-                            'last_status': current_status,
-                            'live_start_time': None,
-                            'anchor_name': anchor_name
-                        }
-                        logger.info(f"初始化直播间 {room_id}({anchor_name}) 状态: {'开播' if current_status == 1 else '下播'}")
+                    # 只记录监控轮询的请求失败，liveinfo指令的失败不影响退避
+                    if result['data'] is None:
+                        self._note_failure(result['retry_after'])
                         continue
-                    
-                    last_status = self.room_status[room_id]['last_status']
-                    
-                    # 状态变化处理
-                    if current_status != last_status:
-                        message = ""
-                        if current_status == 1:  # 开播
-                            live_time = datetime.fromtimestamp(data['live_time'])
-                            self.room_status[room_id]['live_start_time'] = live_time
-                            
-                            # 获取最新主播信息
-                            anchor_info = await self.get_anchor_info(room_id)
-                            actual_name = anchor_info['name']
-                            room_config['anchor_name'] = actual_name  # 更新配置中的名字
-                            self.room_status[room_id]['anchor_name'] = actual_name
-                            
-                            message = f"{actual_name}开播了！\n传送门：https://live.bilibili.com/{room_id}"
-                            if anchor_info['title'] != '未知标题':
-                                message += f"\n标题：{anchor_info['title']}"
-                                
-                        else:  # 下播
-                            actual_name = self.room_status[room_id]['anchor_name']
-                            start_time = self.room_status[room_id]['live_start_time']
-                            
-                            if start_time:
-                                duration = datetime.now() - start_time
-                                hours, remainder = divmod(duration.total_seconds(), 3600)
-                                minutes, seconds = divmod(remainder, 60)
-                                duration_text = f"{int(hours)}时{int(minutes)}分"
-                                message = f"{actual_name}的直播已结束，一共直播了{duration_text}"
-                            else:
-                                message = f"{actual_name}的直播已结束"
-                        
-                        self.room_status[room_id]['last_status'] = current_status
-                        
-                        # 为所有白名单群组添加通知
-                        for group_id in self.white_list_groups:
-                            if group_id not in self.pending_notifications:
-                                self.pending_notifications[group_id] = []
-                            self.pending_notifications[group_id].append(message)
-                        
-                        logger.info(f"直播间 {room_id} 状态变化，已为 {len(self.white_list_groups)} 个群组添加通知: {message}")
+                    self._cycle_succeeded = True
+                    await self.update_room_status(result['room_id'], result['data'])
                 
             except Exception as e:
+                self._note_failure()
                 logger.error(f"监控任务出错: {str(e)}")
             
-            await asyncio.sleep(self.check_interval)
+            await asyncio.sleep(self._next_delay(self.check_interval))
+
+    async def _flush_task(self):
+        """有新通知或到达间隔时，主动向群组推送积压的通知"""
+        while True:
+            try:
+                await asyncio.wait_for(self._notify_event.wait(), timeout=NOTIFY_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._notify_event.clear()
+            
+            for group_id, pending in list(self.pending_notifications.items()):
+                origin = self._group_origins.get(group_id)
+                # 还没收到过该群消息的，等群里有人发言时再发送
+                if not pending or origin is None:
+                    continue
+                messages = list(pending)
+                pending.clear()
+                try:
+                    sent = await self.context.send_message(origin, MessageChain().message("\n\n".join(messages)))
+                except Exception as e:
+                    logger.error(f"向群组 {group_id} 推送通知失败: {str(e)}")
+                    sent = False
+                # 发送失败（包括找不到对应平台）时放回队列，下次再发
+                if sent is False:
+                    pending.extendleft(reversed(messages))
+
+    async def _status_worker(self):
+        """从工作队列取出直播间并检查状态"""
+        while True:
+            room_id = await self._work_q.get()
+            result = None
+            try:
+                result = await self.check_live_status(room_id)
+            except Exception as e:
+                logger.error(f"检查直播间 {room_id} 状态出错: {str(e)}")
+            finally:
+                self._out_q.put_nowait(result)
+
+    async def _resolve_real_id(self, room_id):
+        """获取直播间的真实房间号（配置中可能是短号）"""
+        room_config = self.monitor_map[room_id]
+        if not room_config.get('_real_id'):
+            result = await self.check_live_status(room_id)
+            if result is None or result['data'] is None:
+                return None
+            room_config['_real_id'] = result['data']['room_id']
+        return room_config['_real_id']
+
+    async def _ws_room(self, room_id):
+        """通过直播间长连接接收开播/下播推送"""
+        while True:
+            try:
+                real_id = await self._resolve_real_id(room_id)
+                if real_id is None:
+                    await asyncio.sleep(WS_RECONNECT_DELAY)
+                    continue
+                # 服务端会回应每次心跳，超过两个心跳周期没有消息就认为连接已失效
+                async with self.ws_session.ws_connect(
+                        WS_URL, heartbeat=None, receive_timeout=2 * WS_HEARTBEAT_INTERVAL) as ws:
+                    auth = json.dumps({"roomid": real_id, "uid": 0, "protover": 2})
+                    await ws.send_bytes(self._ws_pack(auth.encode(), WS_OP_AUTH))
+                    heartbeat_task = asyncio.create_task(self._ws_heartbeat(ws))
+                    try:
+                        async for msg in ws:
+                            if msg.type != aiohttp.WSMsgType.BINARY:
+                                break
+                            for op, cmd in self._ws_unpack(msg.data):
+                                if op != WS_OP_AUTH_REPLY:
+                                    await self._ws_dispatch(room_id, cmd)
+                                elif cmd.get('code') == 0:
+                                    # 认证成功后才降低该直播间的轮询频率
+                                    self._ws_connected.add(room_id)
+                                else:
+                                    raise ConnectionError(f"认证失败: {cmd}")
+                    finally:
+                        self._ws_connected.discard(room_id)
+                        heartbeat_task.cancel()
+                        with suppress(asyncio.CancelledError):
+                            await heartbeat_task
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"直播间 {room_id} 长连接出错: {str(e)}")
+            await asyncio.sleep(WS_RECONNECT_DELAY)
+
+    async def _ws_heartbeat(self, ws):
+        """定时发送心跳包维持长连接"""
+        while not ws.closed:
+            try:
+                await ws.send_bytes(self._ws_pack(b"", WS_OP_HEARTBEAT))
+            except (ConnectionError, aiohttp.ClientError):
+                # 连接正在关闭，由接收循环负责重连
+                return
+            await asyncio.sleep(WS_HEARTBEAT_INTERVAL)
+
+    async def _ws_dispatch(self, room_id, cmd):
+        """处理长连接推送的消息"""
+        name = cmd.get('cmd', '')
+        if name == "LIVE":
+            await self.update_room_status(room_id, {'live_status': 1, 'live_time': cmd.get('live_time')})
+        elif name == "PREPARING":
+            await self.update_room_status(room_id, {'live_status': 0})
+
+    @staticmethod
+    def _ws_pack(body, op):
+        """封装长连接数据包"""
+        return WS_HEADER.pack(WS_HEADER.size + len(body), WS_HEADER.size, 1, op, 1) + body
+
+    @classmethod
+    def _ws_unpack(cls, buf):
+        """解析长连接数据包，返回其中的(操作码, 消息)，包括业务消息和认证回复"""
+        messages = []
+        offset = 0
+        while offset + WS_HEADER.size <= len(buf):
+            packet_len, header_len, ver, op, _ = WS_HEADER.unpack_from(buf, offset)
+            # 长度字段异常时停止解析，避免死循环或越界
+            if header_len < WS_HEADER.size or packet_len < header_len or offset + packet_len > len(buf):
+                break
+            body = buf[offset + header_len:offset + packet_len]
+            offset += packet_len
+            if op not in (WS_OP_MESSAGE, WS_OP_AUTH_REPLY):
+                continue
+            if ver == 2:  # zlib压缩，内部是多个完整数据包
+                messages.extend(cls._ws_unpack(zlib.decompress(body)))
+            elif ver == 3 and brotli is not None:
+                messages.extend(cls._ws_unpack(brotli.decompress(body)))
+            elif ver in (0, 1):
+                try:
+                    messages.append((op, json_loads(body)))
+                except ValueError:
+                    pass
+        return messages
 
     async def get_live_info(self, room_id=None):
         """获取直播间信息"""
-        if room_id:
+        await self._session_ready.wait()
+        if room_id is not None:
             # 获取单个直播间信息
-            room_config = next((r for r in self.monitor_list 
-                              if r['room_id'] == room_id), None)
+            room_config = self.monitor_map.get(room_id)
             if not room_config:
                 return f"未找到直播间 {room_id} 的配置"
             
             result = await self.check_live_status(room_id)
-            if result is None:
+            if result is None or result['data'] is None:
                 return f"无法获取直播间 {room_id} 的信息"
             
             data = result['data']
-            anchor_name = room_config.get('anchor_name', f"主播{room_id}")
+            anchor_name = room_config.get('anchor_name', room_config['_default_name'])
             status_text = "直播中" if data['live_status'] == 1 else "未开播"
             
-            info = f"直播间ID: {room_id}\n主播: {anchor_name}\n状态: {status_text}\n"
+            parts = [f"直播间ID: {room_id}\n主播: {anchor_name}\n状态: {status_text}\n"]
             
             if data['live_status'] == 1:
-                start_time = self.room_status.get(room_id, {}).get('live_start_time')
-                if start_time:
-                    duration = datetime.now() - start_time
-                    hours, remainder = divmod(duration.total_seconds(), 3600)
+                state = self.room_status.get(room_id)
+                start_time = state.live_start_monotonic if state else None
+                if start_time is not None:
+                    duration = asyncio.get_running_loop().time() - start_time
+                    hours, remainder = divmod(duration, 3600)
                     minutes, seconds = divmod(remainder, 60)
-                    info += f"开播时间: {start_time.strftime('%Y-%m-%d %H:%M:%S')}\n"
-                    info += f"直播时长: {int(hours)}小时{int(minutes)}分钟{int(seconds)}秒\n"
+                    start_text = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(state.live_start_wall))
+                    parts.append(f"开播时间: {start_text}\n")
+                    parts.append(f"直播时长: {int(hours)}小时{int(minutes)}分钟{int(seconds)}秒\n")
                 
-                # 获取标题
-                anchor_info = await self.get_anchor_info(room_id)
-                info += f"标题: {anchor_info['title']}\n"
+                parts.append(f"标题: {data.get('title') or '未知标题'}\n")
             
-            info += f"最后检查: {result['check_time'].strftime('%Y-%m-%d %H:%M:%S')}\n"
-            info += f"直播间链接: https://live.bilibili.com/{room_id}"
+            parts.append(f"最后检查: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(result['check_time']))}\n")
+            parts.append(f"直播间链接: {room_config['_link']}")
             
-            return info
+            return "".join(parts)
         else:
             # 获取所有直播间信息
             if not self.monitor_list:
                 return "当前没有监控任何直播间"
             
-            info = f"监控中的直播间 ({len(self.monitor_list)}个):\n\n"
+            # 统一取一次当前时间，循环内的时长都基于它计算
+            now = asyncio.get_running_loop().time()
+            parts = [f"监控中的直播间 ({len(self.monitor_list)}个):\n\n"]
             for i, room_config in enumerate(self.monitor_list, 1):
                 room_id = room_config['room_id']
-                anchor_name = room_config.get('anchor_name', f"主播{room_id}")
+                anchor_name = room_config.get('anchor_name', room_config['_default_name'])
                 
-                room_status = self.room_status.get(room_id, {})
-                status_text = "直播中" if room_status.get('last_status') == 1 else "未开播"
+                state = self.room_status.get(room_id)
+                is_live = state is not None and state.last_status == 1
+                status_text = "直播中" if is_live else "未开播"
                 
-                info += f"{i}. {anchor_name} (ID: {room_id}) - {status_text}\n"
+                parts.append(f"{i}. {anchor_name} (ID: {room_id}) - {status_text}\n")
                 
-                if room_status.get('last_status') == 1 and room_status.get('live_start_time'):
-                    duration = datetime.now() - room_status['live_start_time']
-                    hours, remainder = divmod(duration.total_seconds(), 3600)
+                if is_live and state.live_start_monotonic is not None:
+                    duration = now - state.live_start_monotonic
+                    hours, remainder = divmod(duration, 3600)
                     minutes, seconds = divmod(remainder, 60)
-                    info += f"   直播时长: {int(hours)}时{int(minutes)}分\n"
+                    parts.append(f"   直播时长: {int(hours)}时{int(minutes)}分\n")
                 
-                info += f"   链接: https://live.bilibili.com/{room_id}\n\n"
+                parts.append(f"   链接: {room_config['_link']}\n\n")
             
             # 添加白名单群组信息
-            info += f"\n白名单群组 ({len(self.white_list_groups)}个): {', '.join(map(str, self.white_list_groups))}"
+            parts.append(f"\n白名单群组 ({len(self.white_list_groups)}个): {', '.join(map(str, self.white_list_groups))}")
             
-            return info.strip()
+            return "".join(parts).strip()
 
     @filter.event_message_type(filter.EventMessageType.GROUP_MESSAGE)
     async def on_group_message(self, event: AstrMessageEvent):
@@ -234,8 +665,18 @@ class BilibiliLiveMonitor(Star):
         # 检查群号是否在白名单中
         if not self.is_group_in_white_list(group_id):
             return
-            
-        message_str = event.message_str.strip().lower()
+        group_id_str = str(group_id)
+        if self._group_origins.get(group_id_str) != event.unified_msg_origin:
+            self._group_origins[group_id_str] = event.unified_msg_origin
+            self._save_group_origins()
+        
+        # 既不是指令也没有待发通知的消息直接跳过，不做整条消息的处理
+        raw = event.message_str.lstrip()
+        pending = self.pending_notifications.get(str(group_id))
+        if raw[:8].lower() != "liveinfo" and not pending:
+            return
+        
+        message_str = raw.rstrip().lower()
         
         # 查看所有直播间状态
         if message_str == "liveinfo":
@@ -244,27 +685,30 @@ class BilibiliLiveMonitor(Star):
         
         # 查看特定直播间状态
         elif message_str.startswith("liveinfo "):
-            room_id = message_str[9:].strip()
-            if room_id.isdigit():
+            try:
+                room_id = int(message_str.removeprefix("liveinfo ").strip())
+            except ValueError:
+                yield event.plain_result("请输入正确的直播间ID")
+            else:
                 info = await self.get_live_info(room_id)
                 yield event.plain_result(info)
-            else:
-                yield event.plain_result("请输入正确的直播间ID")
         
         # 发送该群组的待通知消息
-        group_id_str = str(group_id)
-        if group_id_str in self.pending_notifications and self.pending_notifications[group_id_str]:
-            for message in self.pending_notifications[group_id_str]:
-                yield event.plain_result(message)
-            
-            # 清空该群组的已发送通知
-            self.pending_notifications[group_id_str] = []
+        if pending:
+            # 取出并清空该群组的通知，合并为一条消息发送
+            messages = list(pending)
+            pending.clear()
+            yield event.plain_result("\n\n".join(messages))
 
     async def terminate(self):
         """清理资源"""
+        for task in self.ws_tasks + self.worker_tasks + [self.monitor, self.flush_task]:
+            task.cancel()
         try:
             if self.session:
                 await self.session.close()
+            if self.ws_session:
+                await self.ws_session.close()
         except:
             pass
         logger.info("BilibiliLiveMonitor插件已停止")
\ No newline at end of file